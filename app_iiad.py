@@ -7,35 +7,80 @@
 #   pip install streamlit pandas plotly openpyxl
 # EJECUCIÓN:
 #   streamlit run app_iiad.py
+# EXPORTACIÓN BI (Parquet / Arrow):
+#   python app_iiad.py exportar-bi --salida modelo.parquet
+#   python app_iiad.py cambios --desde "2026-03-01 00:00:00" --salida delta.parquet
+#   python app_iiad.py servir-bi --puerto 8765
 # =============================================================================
 
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import sqlite3
 import os
-from datetime import datetime, date
+import sys
+import argparse
+import json
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, TimeoutError as FuturesTimeoutError
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
 from io import BytesIO
+# pandas, numpy, plotly, openpyxl y pyarrow (más de medio segundo tras un reinicio
+# en Streamlit Cloud) se importan dentro de las funciones que los usan, para que
+# la barra lateral y el título se pinten antes.
 
 # ─────────────────────────────────────────────────────────────────────────────
 # CONFIGURACIÓN GENERAL DE LA APP
 # ─────────────────────────────────────────────────────────────────────────────
-st.set_page_config(
-    page_title="Sistema Formación IIAD - ICA",
-    page_icon="🧪",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
-DB_PATH = "iiad_formacion.db"
+DB_PATH = "iiad_formacion.db"   # base del área por defecto (IIAD)
+TIMEOUT_ESCRITURA = 30  # segundos que un llamador espera la confirmación de su escritura
+
+# ── ÁREAS ───────────────────────────────────────────────────────────────────
+# Cada área tiene su propia base de datos (un shard por área). Áreas adicionales
+# se declaran en areas.json, p. ej.:
+#   {"LNDV": {"nombre": "Área LNDV"}, "LANIP": {"nombre": "Área LANIP", "db": "lanip.db"}}
+# Si no se indica "db", se usa "<codigo en minúsculas>_formacion.db".
+AREA_DEFECTO = "IIAD"
+AREAS_ARCHIVO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "areas.json")
+
+def _cargar_areas():
+    areas = {AREA_DEFECTO: {"nombre": "Área IIAD", "db": DB_PATH}}
+    if os.path.exists(AREAS_ARCHIVO):
+        with open(AREAS_ARCHIVO, encoding="utf-8") as f:
+            for codigo, config in json.load(f).items():
+                areas[codigo] = {"nombre": config.get("nombre", f"Área {codigo}"),
+                                 "db": config.get("db", f"{codigo.lower()}_formacion.db")}
+    return areas
+
+AREAS = _cargar_areas()
+
+def area_actual():
+    """Área elegida en la sesión de Streamlit; AREA_DEFECTO fuera de una sesión
+    (línea de comandos, servidor BI, hilos de trabajo)."""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return AREA_DEFECTO
+    return st.session_state.get("area", AREA_DEFECTO)
+
+def db_path(area=None):
+    """Archivo de la base de datos (shard) del área."""
+    area = area or area_actual()
+    if area not in AREAS:
+        raise ValueError(f"Área desconocida: {area} (disponibles: {', '.join(AREAS)})")
+    return AREAS[area]["db"]
 
 # ─────────────────────────────────────────────────────────────────────────────
 # INICIALIZACIÓN DE BASE DE DATOS
 # ─────────────────────────────────────────────────────────────────────────────
-def init_db():
-    """Crea las tablas si no existen y carga datos iniciales."""
-    conn = sqlite3.connect(DB_PATH)
+def init_db(area=None):
+    """Crea las tablas si no existen y carga datos iniciales del área."""
+    area = area or area_actual()
+    conn = sqlite3.connect(db_path(area))
+    # WAL: los lectores (reportes) trabajan sobre una instantánea y no bloquean
+    # ni son bloqueados por el escritor. El modo queda guardado en el archivo.
+    conn.execute("PRAGMA journal_mode=WAL")
     c = conn.cursor()
 
     c.executescript("""
@@ -99,14 +144,120 @@ def init_db():
 
     # Cargar datos iniciales si las tablas están vacías
     if c.execute("SELECT COUNT(*) FROM documentos").fetchone()[0] == 0:
-        _cargar_datos_iniciales(c)
+        _cargar_datos_iniciales(c, area)
 
+    _migrar_esquema(c)
     conn.commit()
     conn.close()
 
 
-def _cargar_datos_iniciales(c):
-    """Carga el catálogo de documentos y roles del área IIAD."""
+# ── FECHAS ──────────────────────────────────────────────────────────────────
+# Las fechas de avances se guardan como texto ISO 'AAAA-MM-DD': el orden
+# lexicográfico coincide con el cronológico, así que los rangos usan índice.
+FORMATOS_FECHA = ("%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%d-%m-%Y",
+                  "%Y-%m-%d %H:%M:%S", "%d/%m/%y")
+
+def normalizar_fecha(valor):
+    """Devuelve la fecha en formato ISO 'AAAA-MM-DD' (None si está vacía).
+    Lanza ValueError si el texto no corresponde a una fecha válida."""
+    if valor is None:
+        return None
+    if isinstance(valor, datetime):
+        return valor.date().isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    texto = str(valor).strip()
+    # 'nan'/'None' son restos de vacíos de pandas guardados como texto
+    if texto.lower() in ("", "nan", "nat", "none"):
+        return None
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha no válida: '{texto}' (use AAAA-MM-DD)")
+
+
+# ── MIGRACIONES ─────────────────────────────────────────────────────────────
+# La versión del esquema se guarda en PRAGMA user_version.
+def _migracion_1_fechas(c):
+    """Normaliza las fechas de texto libre a ISO, indexa y valida las nuevas."""
+    filas = c.execute(
+        "SELECT id, fecha_inicio, fecha_completitud, observaciones FROM avances"
+    ).fetchall()
+    for av_id, fi, ff, obs in filas:
+        nuevas, no_validas = [], []
+        for campo, valor in (("inicio", fi), ("completitud", ff)):
+            try:
+                nuevas.append(normalizar_fecha(valor))
+            except ValueError:
+                # No se pierde el dato: el texto original pasa a observaciones
+                nuevas.append(None)
+                no_validas.append(f"[fecha {campo} original no válida: {valor}]")
+        if nuevas != [fi, ff]:
+            obs = " ".join([obs or ""] + no_validas).strip() or None
+            c.execute("UPDATE avances SET fecha_inicio=?, fecha_completitud=?, "
+                      "observaciones=? WHERE id=?", (nuevas[0], nuevas[1], obs, av_id))
+
+    c.executescript("""
+        CREATE INDEX IF NOT EXISTS idx_avances_fecha_completitud
+            ON avances (fecha_completitud);
+        CREATE INDEX IF NOT EXISTS idx_avances_estado_fecha
+            ON avances (estado, fecha_completitud);
+        CREATE INDEX IF NOT EXISTS idx_avances_fecha_inicio
+            ON avances (fecha_inicio);
+    """)
+    for operacion in ("INSERT", "UPDATE"):
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS avances_fechas_validas_{operacion.lower()}
+            BEFORE {operacion} ON avances
+            WHEN (NEW.fecha_inicio IS NOT NULL
+                  AND date(NEW.fecha_inicio) IS NOT NEW.fecha_inicio)
+              OR (NEW.fecha_completitud IS NOT NULL
+                  AND date(NEW.fecha_completitud) IS NOT NEW.fecha_completitud)
+            BEGIN
+                SELECT RAISE(ABORT, 'fecha no válida: use AAAA-MM-DD');
+            END
+        """)
+
+def _migracion_2_indice_cambios(c):
+    """Índice para el extracto incremental de cambios (exportación BI)."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_avances_timestamp "
+              "ON avances (timestamp_registro)")
+
+def _migracion_3_planificador(c):
+    """Tablas del planificador: asistentes por sesión y parámetros persistentes."""
+    c.executescript("""
+        CREATE TABLE IF NOT EXISTS cronograma_participantes (
+            cronograma_id INTEGER NOT NULL,
+            persona_id INTEGER NOT NULL,
+            PRIMARY KEY (cronograma_id, persona_id),
+            FOREIGN KEY (cronograma_id) REFERENCES cronograma(id),
+            FOREIGN KEY (persona_id) REFERENCES personal(id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_participantes_persona
+            ON cronograma_participantes (persona_id);
+        CREATE INDEX IF NOT EXISTS idx_cronograma_semana ON cronograma (semana);
+
+        CREATE TABLE IF NOT EXISTS configuracion (
+            clave TEXT PRIMARY KEY,
+            valor TEXT
+        );
+    """)
+
+MIGRACIONES = [_migracion_1_fechas, _migracion_2_indice_cambios, _migracion_3_planificador]
+
+def _migrar_esquema(c):
+    """Aplica en orden las migraciones aún no ejecutadas en esta base de datos."""
+    version = c.execute("PRAGMA user_version").fetchone()[0]
+    for numero, migracion in enumerate(MIGRACIONES[version:], start=version + 1):
+        migracion(c)
+        c.execute(f"PRAGMA user_version = {numero}")
+
+
+def _cargar_datos_iniciales(c, area=AREA_DEFECTO):
+    """Carga el catálogo de documentos SAD y los roles del área (los roles
+    'Responsable/Profesional área IIAD' toman el código del área)."""
 
     # ── DOCUMENTOS ──────────────────────────────────────────────────────────
     documentos = [
@@ -216,6 +367,7 @@ def _cargar_datos_iniciales(c):
     }
 
     for rol, codigos in roles_config.items():
+        rol = rol.replace(AREA_DEFECTO, area)
         for codigo in set(codigos):
             doc_id = c.execute("SELECT id FROM documentos WHERE codigo=?", (codigo,)).fetchone()
             if doc_id:
@@ -223,6 +375,8 @@ def _cargar_datos_iniciales(c):
                           (rol, doc_id[0]))
 
     # ── PERSONAL DE EJEMPLO ─────────────────────────────────────────────────
+    if area != AREA_DEFECTO:
+        return
     personal_ejemplo = [
         ("Juan Pérez García",     "Responsable área IIAD",     "2023-01-15", "Activo"),
         ("María González López",  "Profesional área IIAD",     "2024-03-20", "Activo"),
@@ -236,64 +390,253 @@ def _cargar_datos_iniciales(c):
     )
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# COLA DE ESCRITURA SERIALIZADA
+# ─────────────────────────────────────────────────────────────────────────────
+# SQLite admite un único escritor a la vez: si varias sesiones guardan al mismo
+# tiempo, cada una con su propia transacción, aparecen errores "database is
+# locked". Todas las escrituras pasan por un solo hilo que agrupa lo pendiente
+# de todas las sesiones en una transacción y reintenta ante bloqueos externos.
+def _es_bloqueo(error):
+    """True si el error es un bloqueo transitorio de SQLite (se puede reintentar)."""
+    return (isinstance(error, sqlite3.OperationalError)
+            and ("locked" in str(error) or "busy" in str(error)))
+
+
+class ColaEscritura:
+    """Escritor único en proceso con lotes, reintentos y confirmación por Future."""
+
+    def __init__(self, db_path, max_lote=500, max_reintentos=6, espera_base=0.05):
+        self.db_path = db_path
+        self.max_lote = max_lote
+        self.max_reintentos = max_reintentos
+        self.espera_base = espera_base
+        self._cola = queue.Queue()
+        self._hilo = threading.Thread(target=self._bucle, name="escritor-sqlite",
+                                      daemon=True)
+        self._hilo.start()
+
+    def enviar(self, operacion, *args, **kwargs):
+        """Encola `operacion(cursor, *args, **kwargs)`. El Future devuelto se
+        resuelve con el resultado de la operación cuando su lote hace COMMIT."""
+        futuro = Future()
+        self._cola.put((operacion, args, kwargs, futuro))
+        return futuro
+
+    def _bucle(self):
+        while True:
+            lote = [self._cola.get()]
+            # Todo lo que llegó mientras se escribía el lote anterior va en este
+            while len(lote) < self.max_lote:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            lote = [item for item in lote if item[3].set_running_or_notify_cancel()]
+            if lote:
+                self._procesar(lote)
+
+    def _procesar(self, lote):
+        try:
+            resultados = self._con_reintentos(lote)
+        except Exception as e:
+            if len(lote) == 1 or _es_bloqueo(e):
+                # Bloqueo persistente: repetir de a una solo alargaría la espera
+                # de todas las sesiones, así que falla el lote completo.
+                for item in lote:
+                    item[3].set_exception(e)
+                return
+            # Una operación inválida no debe tumbar las de otras sesiones:
+            # se repite el lote de a una para aislar la que falla.
+            for item in lote:
+                self._procesar([item])
+            return
+        for item, resultado in zip(lote, resultados):
+            item[3].set_result(resultado)
+
+    def _con_reintentos(self, lote):
+        for intento in range(self.max_reintentos + 1):
+            try:
+                return self._transaccion(lote)
+            except sqlite3.OperationalError as e:
+                if not _es_bloqueo(e) or intento == self.max_reintentos:
+                    raise
+                # Backoff exponencial con jitter para no sincronizarse con otro escritor
+                time.sleep(self.espera_base * (2 ** intento) * (1 + random.random()))
+
+    def _transaccion(self, lote):
+        # Sin busy_timeout: la única espera ante un bloqueo es el backoff (~3-6 s en total)
+        conn = sqlite3.connect(self.db_path, timeout=0, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            c = conn.cursor()
+            resultados = [op(c, *args, **kwargs) for op, args, kwargs, _ in lote]
+            conn.execute("COMMIT")
+            return resultados
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+
+@st.cache_resource
+def get_cola_escritura(db):
+    """Una sola cola (y un solo hilo escritor) por base de datos, compartida por
+    todas las sesiones."""
+    return ColaEscritura(db)
+
+def esperar_escrituras(futuros):
+    """Espera hasta TIMEOUT_ESCRITURA las operaciones encoladas y devuelve sus
+    resultados. Las que aún no empezaron se cancelan, para que no se confirmen
+    después de informar el error; las que ya están en un lote se esperan hasta
+    su COMMIT o ROLLBACK. Lanza FuturesTimeoutError si se canceló alguna, o la
+    primera excepción de las que fallaron."""
+    _, pendientes = wait(futuros, timeout=TIMEOUT_ESCRITURA)
+    for f in pendientes:
+        f.cancel()
+    wait(pendientes)
+    canceladas = sum(f.cancelled() for f in futuros)
+    if canceladas:
+        raise FuturesTimeoutError(
+            f"{canceladas} de {len(futuros)} escrituras no alcanzaron a iniciarse en "
+            f"{TIMEOUT_ESCRITURA} s y se cancelaron (no se guardaron)")
+    return [f.result() for f in futuros]
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # FUNCIONES DE ACCESO A DATOS
 # ─────────────────────────────────────────────────────────────────────────────
-def get_conn():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
+def get_conn(area=None):
+    return sqlite3.connect(db_path(area), check_same_thread=False)
+
+@contextmanager
+def lectura_consistente(area=None):
+    """Conexión con una única transacción de lectura: todas las consultas hechas
+    con ella ven el mismo estado de la base (instantánea WAL), aunque otras
+    sesiones guarden avances mientras tanto. Entrega (conexión, marca_de_tiempo)."""
+    conn = sqlite3.connect(db_path(area), isolation_level=None, check_same_thread=False)
+    try:
+        conn.execute("BEGIN")
+        # La instantánea se fija con la primera lectura de la transacción
+        conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        marca = conn.execute("SELECT datetime('now', 'localtime')").fetchone()[0]
+        yield conn, marca
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.close()
 
-def get_personal():
-    conn = get_conn()
-    df = pd.read_sql("SELECT * FROM personal WHERE estado='Activo' ORDER BY nombre", conn)
-    conn.close()
+def _formato_marca(marca):
+    """Marca de una instantánea ('AAAA-MM-DD HH:MM:SS') como se muestra en pantalla."""
+    return datetime.fromisoformat(marca).strftime("%d/%m/%Y %H:%M:%S")
+
+def _leer_sql(consulta, params=None, area=None, conn=None):
+    """pd.read_sql sobre `conn` (p. ej. una instantánea) o, si no se da, sobre
+    una conexión nueva del área que se cierra al terminar."""
+    import pandas as pd
+    if conn is not None:
+        return pd.read_sql(consulta, conn, params=params)
+    propia = get_conn(area)
+    try:
+        return pd.read_sql(consulta, propia, params=params)
+    finally:
+        propia.close()
+
+# ── MODELO COMPACTO EN MEMORIA ──────────────────────────────────────────────
+# Los textos repetidos (rol, estado, categoría, nivel, norma) se cargan como
+# categóricos y los ids como int32: cada sesión guarda menos memoria y los
+# filtros/merges comparan enteros. `estado_cod` es el código precalculado del
+# estado de avance (índice en ESTADOS_AVANCE).
+ESTADOS_AVANCE = ["Pendiente", "En curso", "Completado"]
+COD_PENDIENTE, COD_EN_CURSO, COD_COMPLETADO = range(len(ESTADOS_AVANCE))
+
+COLUMNAS_ID = ("id", "persona_id", "documento_id")
+COLUMNAS_CATEGORICAS = ("rol", "estado", "categoria", "nivel", "norma_cubierta")
+
+def _compactar(df, estados=None):
+    """Convierte un DataFrame leído de SQLite al modelo compacto (in place).
+    Con `estados`, la columna estado usa esas categorías fijas y se agrega
+    `estado_cod` (int8) con su código; un estado vacío o desconocido cuenta
+    como el primero (Pendiente)."""
+    import pandas as pd
+    # Una fila sin persona o documento (el esquema lo permite) no se puede
+    # atribuir a nadie; se descarta para que los ids sean int32 sin nulos.
+    df.dropna(subset=[col for col in COLUMNAS_ID if col in df.columns], inplace=True)
+    for col in df.columns:
+        if col in COLUMNAS_ID:
+            df[col] = df[col].astype("int32")
+        elif col == "es_critico":
+            df[col] = df[col].fillna(0).astype("int8")
+        elif col in COLUMNAS_CATEGORICAS:
+            df[col] = df[col].astype("category")
+    if estados is not None:
+        # Fuera de las categorías queda NaN (código -1), que se rellena
+        df["estado"] = pd.Series(pd.Categorical(df["estado"], categories=estados),
+                                 index=df.index).fillna(estados[0])
+        df["estado_cod"] = df["estado"].cat.codes.astype("int8")
     return df
 
-def get_documentos():
-    conn = get_conn()
-    df = pd.read_sql("SELECT * FROM documentos ORDER BY categoria, codigo", conn)
-    conn.close()
-    return df
+def _unir_avances(docs_rol, avances):
+    """Documentos del rol + avance de la persona; los sin registro quedan Pendiente."""
+    merged = docs_rol.merge(avances, left_on="id", right_on="documento_id", how="left")
+    merged["estado"] = merged["estado"].fillna(ESTADOS_AVANCE[COD_PENDIENTE])
+    merged["estado_cod"] = merged["estado_cod"].fillna(COD_PENDIENTE).astype("int8")
+    return merged
+
+def get_personal(area=None, conn=None):
+    df = _leer_sql("SELECT * FROM personal WHERE estado='Activo' ORDER BY nombre",
+                   area=area, conn=conn)
+    return _compactar(df)
 
-def get_docs_por_rol(rol):
-    conn = get_conn()
-    df = pd.read_sql("""
+def get_documentos(area=None):
+    df = _leer_sql("SELECT * FROM documentos ORDER BY categoria, codigo", area=area)
+    return _compactar(df)
+
+def get_docs_por_rol(rol, area=None, conn=None):
+    df = _leer_sql("""
         SELECT d.id, d.codigo, d.nombre, d.categoria, d.horas, d.nivel,
                d.norma_cubierta, d.es_critico
         FROM documentos d
         JOIN requisitos_rol rr ON d.id = rr.documento_id
         WHERE rr.rol = ?
         ORDER BY d.es_critico DESC, d.categoria, d.codigo
-    """, conn, params=(rol,))
-    conn.close()
-    return df
+    """, params=(str(rol),), area=area, conn=conn)
+    return _compactar(df)
 
-def get_avance_persona(persona_id):
-    conn = get_conn()
-    df = pd.read_sql("""
+def get_avance_persona(persona_id, area=None, conn=None):
+    df = _leer_sql("""
         SELECT a.documento_id, a.estado, a.fecha_completitud,
                a.calificacion, a.observaciones, a.fecha_inicio
         FROM avances a
         WHERE a.persona_id = ?
-    """, conn, params=(persona_id,))
-    conn.close()
-    return df
+    """, params=(int(persona_id),), area=area, conn=conn)
+    return _compactar(df, estados=ESTADOS_AVANCE)
 
-def guardar_avance(persona_id, documento_id, estado, fecha_inicio,
-                   fecha_completitud, calificacion, observaciones, registrado_por):
-    conn = get_conn()
-    c = conn.cursor()
+def get_avances_estado(area=None):
+    """Estado de avance de todas las personas (persona_id, documento_id, estado_cod)."""
+    df = _leer_sql("SELECT persona_id, documento_id, estado FROM avances", area=area)
+    return _compactar(df, estados=ESTADOS_AVANCE)
+
+def _escribir_avance(c, persona_id, documento_id, estado, fecha_inicio,
+                     fecha_completitud, calificacion, observaciones, registrado_por):
     existing = c.execute(
         "SELECT id FROM avances WHERE persona_id=? AND documento_id=?",
         (persona_id, documento_id)
     ).fetchone()
     if existing:
+        # Sin cambios reales no se toca la fila (ni su timestamp_registro)
         c.execute("""
             UPDATE avances SET estado=?, fecha_inicio=?, fecha_completitud=?,
             calificacion=?, observaciones=?, registrado_por=?,
             timestamp_registro=datetime('now','localtime')
             WHERE persona_id=? AND documento_id=?
+              AND (estado IS NOT ? OR fecha_inicio IS NOT ? OR fecha_completitud IS NOT ?
+                   OR calificacion IS NOT ? OR observaciones IS NOT ?)
         """, (estado, fecha_inicio, fecha_completitud, calificacion,
-              observaciones, registrado_por, persona_id, documento_id))
+              observaciones, registrado_por, persona_id, documento_id,
+              estado, fecha_inicio, fecha_completitud, calificacion, observaciones))
     else:
         c.execute("""
             INSERT INTO avances (persona_id, documento_id, estado, fecha_inicio,
@@ -301,39 +644,91 @@ def guardar_avance(persona_id, documento_id, estado, fecha_inicio,
             VALUES (?,?,?,?,?,?,?,?)
         """, (persona_id, documento_id, estado, fecha_inicio,
               fecha_completitud, calificacion, observaciones, registrado_por))
-    conn.commit()
-    conn.close()
 
-def calcular_estadisticas_persona(persona_id, rol):
-    docs_rol = get_docs_por_rol(rol)
-    avances = get_avance_persona(persona_id)
+def guardar_avance(persona_id, documento_id, estado, fecha_inicio,
+                   fecha_completitud, calificacion, observaciones, registrado_por,
+                   area=None):
+    """Encola el avance en el escritor único y espera a que quede confirmado."""
+    guardar_avances([dict(
+        persona_id=persona_id, documento_id=documento_id, estado=estado,
+        fecha_inicio=fecha_inicio, fecha_completitud=fecha_completitud,
+        calificacion=calificacion, observaciones=observaciones,
+        registrado_por=registrado_por
+    )], area)
+
+def guardar_avances(registros, area=None):
+    """Encola varios avances a la vez (se agrupan en el mismo lote) y espera su COMMIT.
+    Lanza ValueError si alguna fecha no es válida (antes de escribir nada) y la
+    primera excepción si alguna escritura no pudo confirmarse."""
+    registros = [dict(r, fecha_inicio=normalizar_fecha(r["fecha_inicio"]),
+                      fecha_completitud=normalizar_fecha(r["fecha_completitud"]))
+                 for r in registros]
+    cola = get_cola_escritura(db_path(area))
+    esperar_escrituras([cola.enviar(_escribir_avance, **r) for r in registros])
+
+def agregar_persona(nombre, rol, fecha_ingreso, area=None):
+    esperar_escrituras([get_cola_escritura(db_path(area)).enviar(
+        lambda c: c.execute(
+            "INSERT INTO personal (nombre, rol, fecha_ingreso) VALUES (?,?,?)",
+            (nombre, rol, fecha_ingreso))
+    )])
+
+def get_completados_rango(desde, hasta, area=None, conn=None):
+    """Formaciones completadas entre dos fechas (incluidas), filtradas en SQL."""
+    return _leer_sql("""
+        SELECT a.fecha_completitud, p.nombre, p.rol, d.codigo, d.nombre AS documento,
+               d.horas, a.calificacion
+        FROM avances a
+        JOIN personal p ON p.id = a.persona_id
+        JOIN documentos d ON d.id = a.documento_id
+        WHERE a.estado = 'Completado'
+          AND a.fecha_completitud BETWEEN ? AND ?
+        ORDER BY a.fecha_completitud, p.nombre
+    """, (normalizar_fecha(desde), normalizar_fecha(hasta)), area, conn)
+
+def get_completados_por_mes(desde, hasta, area=None, conn=None):
+    """Número de completitudes y horas por mes ('AAAA-MM'), agregadas en SQL."""
+    return _leer_sql("""
+        SELECT substr(a.fecha_completitud, 1, 7) AS mes,
+               COUNT(*) AS completados, SUM(d.horas) AS horas
+        FROM avances a
+        JOIN documentos d ON d.id = a.documento_id
+        WHERE a.estado = 'Completado'
+          AND a.fecha_completitud BETWEEN ? AND ?
+        GROUP BY mes
+        ORDER BY mes
+    """, (normalizar_fecha(desde), normalizar_fecha(hasta)), area, conn)
+
+def calcular_estadisticas_persona(persona_id, rol, area=None, conn=None):
+    import numpy as np
+    docs_rol = get_docs_por_rol(rol, area, conn)
+    avances = get_avance_persona(persona_id, area, conn)
     if docs_rol.empty:
         return {"total": 0, "completados": 0, "en_curso": 0, "pendientes": 0,
                 "pct_avance": 0.0, "horas_completadas": 0.0, "horas_totales": 0.0}
-    merged = docs_rol.merge(avances, left_on="id", right_on="documento_id", how="left")
-    merged["estado"] = merged["estado"].fillna("Pendiente")
+    merged = _unir_avances(docs_rol, avances)
+    codigos = merged["estado_cod"].to_numpy()
+    horas = merged["horas"].to_numpy()
+    pendientes, en_curso, completados = np.bincount(codigos, minlength=len(ESTADOS_AVANCE))
     total = len(merged)
-    completados = (merged["estado"] == "Completado").sum()
-    en_curso = (merged["estado"] == "En curso").sum()
-    pendientes = (merged["estado"] == "Pendiente").sum()
-    horas_totales = merged["horas"].sum()
-    horas_completadas = merged.loc[merged["estado"] == "Completado", "horas"].sum()
+    horas_totales = horas.sum()
+    horas_completadas = horas[codigos == COD_COMPLETADO].sum()
     pct = (completados / total * 100) if total > 0 else 0.0
     return {
-        "total": total, "completados": completados, "en_curso": en_curso,
-        "pendientes": pendientes, "pct_avance": round(pct, 1),
-        "horas_completadas": round(horas_completadas, 1),
-        "horas_totales": round(horas_totales, 1)
+        "total": total, "completados": int(completados), "en_curso": int(en_curso),
+        "pendientes": int(pendientes), "pct_avance": round(float(pct), 1),
+        "horas_completadas": round(float(horas_completadas), 1),
+        "horas_totales": round(float(horas_totales), 1)
     }
 
-def exportar_excel():
-    personal = get_personal()
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        personal.to_excel(writer, sheet_name="Personal", index=False)
+def exportar_excel(area=None):
+    import pandas as pd
+    # Todas las lecturas del reporte salen de la misma instantánea
+    with lectura_consistente(area) as (conn, marca):
+        personal = get_personal(area, conn)
         resumen = []
         for _, p in personal.iterrows():
-            stats = calcular_estadisticas_persona(p["id"], p["rol"])
+            stats = calcular_estadisticas_persona(p["id"], p["rol"], area, conn)
             resumen.append({
                 "Nombre": p["nombre"], "Rol": p["rol"],
                 "% Avance": stats["pct_avance"],
@@ -342,11 +737,471 @@ def exportar_excel():
                 "Horas Completadas": stats["horas_completadas"],
                 "Horas Totales": stats["horas_totales"],
             })
+    info = pd.DataFrame([
+        ("Área", AREAS[area or area_actual()]["nombre"]),
+        ("Instantánea de datos", marca),
+    ], columns=["Campo", "Valor"])
+
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        info.to_excel(writer, sheet_name="Información", index=False)
+        personal.to_excel(writer, sheet_name="Personal", index=False)
         pd.DataFrame(resumen).to_excel(writer, sheet_name="Resumen Avances", index=False)
     output.seek(0)
     return output
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# RESUMEN EJECUTIVO MULTIÁREA
+# ─────────────────────────────────────────────────────────────────────────────
+# Cada shard calcula sus agregados en SQL; aquí solo se consultan en paralelo y
+# se combinan (sumas y promedio ponderado por personas), sin una base global.
+CONSULTA_AGREGADOS_AREA = """
+    WITH por_persona AS (
+        SELECT p.id,
+               COUNT(*) AS total,
+               SUM(COALESCE(a.estado = 'Completado', 0)) AS completados,
+               SUM(COALESCE(a.estado = 'En curso', 0)) AS en_curso,
+               SUM(d.horas) AS horas_totales,
+               SUM(CASE WHEN a.estado = 'Completado' THEN d.horas ELSE 0 END)
+                   AS horas_completadas
+        FROM personal p
+        JOIN requisitos_rol rr ON rr.rol = p.rol
+        JOIN documentos d ON d.id = rr.documento_id
+        LEFT JOIN avances a ON a.persona_id = p.id AND a.documento_id = d.id
+        WHERE p.estado = 'Activo'
+        GROUP BY p.id
+    )
+    SELECT COUNT(*) AS personas,
+           COALESCE(SUM(total), 0) AS requisitos,
+           COALESCE(SUM(completados), 0) AS completados,
+           COALESCE(SUM(en_curso), 0) AS en_curso,
+           COALESCE(SUM(horas_totales), 0) AS horas_totales,
+           COALESCE(SUM(horas_completadas), 0) AS horas_completadas,
+           COALESCE(SUM(completados = total), 0) AS personas_completas,
+           COALESCE(SUM(completados * 100.0 / total < 20), 0) AS personas_alerta,
+           COALESCE(AVG(completados * 100.0 / total), 0) AS avance_promedio
+    FROM por_persona
+"""
+
+def get_agregados_area(area):
+    """Agregados de un área, o None si su base de datos aún no existe."""
+    if not os.path.exists(db_path(area)):
+        return None
+    conn = get_conn(area)
+    cur = conn.execute(CONSULTA_AGREGADOS_AREA)
+    agregados = dict(zip([col[0] for col in cur.description], cur.fetchone()))
+    conn.close()
+    return agregados
+
+def resumen_ejecutivo_areas():
+    """Consulta todos los shards en paralelo y devuelve una fila por área más
+    la fila TOTAL combinada."""
+    import pandas as pd
+    with ThreadPoolExecutor(max_workers=len(AREAS)) as pool:
+        resultados = dict(zip(AREAS, pool.map(get_agregados_area, AREAS)))
+    filas = [dict(area=codigo, nombre=AREAS[codigo]["nombre"], **agregados)
+             for codigo, agregados in resultados.items() if agregados]
+    df = pd.DataFrame(filas)
+    if df.empty:
+        return df
+    total = df.drop(columns=["area", "nombre", "avance_promedio"]).sum()
+    total["avance_promedio"] = ((df["avance_promedio"] * df["personas"]).sum()
+                                / total["personas"]) if total["personas"] else 0.0
+    df = pd.concat([df, pd.DataFrame([dict(area="TOTAL", nombre="Todas las áreas",
+                                           **total)])], ignore_index=True)
+    conteos = ["personas", "requisitos", "completados", "en_curso",
+               "personas_completas", "personas_alerta"]
+    df[conteos] = df[conteos].astype("int32")
+    df["avance_promedio"] = df["avance_promedio"].round(1)
+    return df
+
+def get_roles(area=None):
+    """Roles definidos en requisitos_rol del área, en orden de creación."""
+    conn = get_conn(area)
+    roles = [r[0] for r in conn.execute(
+        "SELECT rol FROM requisitos_rol GROUP BY rol ORDER BY MIN(id)")]
+    conn.close()
+    return roles
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PLANIFICADOR DEL CRONOGRAMA
+# ─────────────────────────────────────────────────────────────────────────────
+# Arma el plan semana a semana a partir de lo que le falta a cada persona
+# (requisitos de su rol sin completar): documentos críticos primero, las
+# personas que comparten un requisito van a la misma sesión, sin pasar de la
+# capacidad semanal de capacitación ni de las horas máximas por persona.
+SEMANAS_CRONOGRAMA = 26
+CAPACIDAD_SEMANAL_DEFECTO = 16.0            # horas de sesión dictables por semana
+MAX_HORAS_PERSONA_DEFECTO = 6.0             # horas de formación por persona y semana
+MESES_ABREV = ["Ene", "Feb", "Mar", "Abr", "May", "Jun",
+               "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
+
+def get_parametro(clave, defecto, area=None, conn=None):
+    propia = get_conn(area) if conn is None else None
+    try:
+        fila = (conn or propia).execute(
+            "SELECT valor FROM configuracion WHERE clave=?", (clave,)).fetchone()
+    finally:
+        if propia is not None:
+            propia.close()
+    if not fila:
+        return defecto
+    if isinstance(defecto, date):
+        return date.fromisoformat(fila[0])
+    return type(defecto)(fila[0])
+
+def guardar_parametros(area=None, **parametros):
+    esperar_escrituras([get_cola_escritura(db_path(area)).enviar(
+        lambda c: c.executemany(
+            "INSERT OR REPLACE INTO configuracion (clave, valor) VALUES (?,?)",
+            [(k, str(v)) for k, v in parametros.items()])
+    )])
+
+def inicio_por_defecto():
+    """Lunes de la semana en curso: inicio del período mientras no se guarde otro."""
+    hoy = date.today()
+    return hoy - timedelta(days=hoy.weekday())
+
+def get_inicio_cronograma(area=None, conn=None):
+    return get_parametro("inicio_cronograma", inicio_por_defecto(), area, conn)
+
+def semana_actual(inicio):
+    """Semana del cronograma en curso (1 antes del inicio del período)."""
+    return max(1, (date.today() - inicio).days // 7 + 1)
+
+def get_necesidades_formacion(area=None, conn=None):
+    """Pares persona/documento requeridos por el rol y aún no completados."""
+    df = _leer_sql("""
+        SELECT p.id AS persona_id, p.rol, d.id AS documento_id, d.codigo, d.nombre,
+               d.categoria, COALESCE(d.horas, 0) AS horas, d.es_critico
+        FROM personal p
+        JOIN requisitos_rol rr ON rr.rol = p.rol
+        JOIN documentos d ON d.id = rr.documento_id
+        LEFT JOIN avances a ON a.persona_id = p.id AND a.documento_id = d.id
+        WHERE p.estado = 'Activo' AND COALESCE(a.estado, 'Pendiente') <> 'Completado'
+    """, area=area, conn=conn)
+    return _compactar(df)
+
+def planificar_cronograma(necesidades, capacidad_semanal, max_horas_persona,
+                          semana_inicial=1, semanas=SEMANAS_CRONOGRAMA,
+                          inicio=None):
+    """Plan voraz por semanas. Devuelve (sesiones, pares_sin_programar).
+
+    Cada documento se dicta en la primera semana con capacidad libre a todas
+    las personas que lo necesitan y aún tienen horas disponibles esa semana;
+    el resto pasa a la siguiente. Una sesión más larga que el máximo por
+    persona (o que la capacidad semanal) solo se asigna en una semana vacía
+    para esa persona (o para el equipo). Sin `inicio`, la semana 1 es la actual."""
+    import numpy as np
+    inicio = inicio or inicio_por_defecto()
+    if necesidades.empty or semana_inicial > semanas:
+        return [], len(necesidades)
+
+    personas, idx_persona = np.unique(necesidades["persona_id"].to_numpy(),
+                                      return_inverse=True)
+    rol_persona = np.empty(len(personas), dtype=object)
+    rol_persona[idx_persona] = necesidades["rol"].astype(str).to_numpy()
+    todos_los_roles = set(rol_persona)
+
+    # Asistentes por documento (índices de persona), sin groupby por fila
+    doc_ids = necesidades["documento_id"].to_numpy()
+    orden = np.argsort(doc_ids, kind="stable")
+    ids_ordenados = doc_ids[orden]
+    inicios = np.flatnonzero(np.r_[True, ids_ordenados[1:] != ids_ordenados[:-1]])
+    asistentes = dict(zip(ids_ordenados[inicios].tolist(),
+                          np.split(idx_persona[orden], inicios[1:])))
+
+    documentos = (necesidades.drop_duplicates("documento_id")
+                  .sort_values(["es_critico", "documento_id"], ascending=[False, True]))
+
+    n_semanas = semanas - semana_inicial + 1
+    carga = np.zeros((n_semanas, len(personas)))
+    libre = np.full(n_semanas, float(capacidad_semanal))
+    sesiones, sin_programar = [], 0
+
+    for doc in documentos.itertuples(index=False):
+        pendientes, horas = asistentes[doc.documento_id], float(doc.horas)
+        for w in range(n_semanas):
+            if not pendientes.size:
+                break
+            if horas > libre[w] and libre[w] < capacidad_semanal:
+                continue
+            carga_w = carga[w, pendientes]
+            caben = (carga_w + horas <= max_horas_persona) | (carga_w == 0)
+            if not caben.any():
+                continue
+            grupo = pendientes[caben]
+            carga[w, grupo] += horas
+            libre[w] -= horas
+            pendientes = pendientes[~caben]
+
+            semana = semana_inicial + w
+            lunes = inicio + timedelta(weeks=semana - 1)
+            roles = set(rol_persona[grupo])
+            sesiones.append({
+                "semana": semana,
+                "mes": (lunes.year - inicio.year) * 12 + lunes.month - inicio.month + 1,
+                "mes_nombre": MESES_ABREV[lunes.month - 1],
+                "bloque": str(doc.categoria),
+                "documento_id": int(doc.documento_id),
+                "codigo_doc": doc.codigo,
+                "nombre_actividad": doc.nombre,
+                "horas": horas,
+                "roles_aplicables": "TODOS" if roles == todos_los_roles
+                                    else " / ".join(sorted(roles)),
+                "modalidad": "Presencial grupal" if len(grupo) > 1 else "Autoestudio guiado",
+                "prioridad": "⚠️ CRÍTICA" if doc.es_critico else "ALTA",
+                "participantes": personas[grupo].tolist(),
+            })
+        sin_programar += pendientes.size
+    return sesiones, sin_programar
+
+def _escribir_cronograma(c, semana_desde, sesiones):
+    c.execute("""DELETE FROM cronograma_participantes WHERE cronograma_id IN
+                 (SELECT id FROM cronograma WHERE semana >= ?)""", (semana_desde,))
+    c.execute("DELETE FROM cronograma WHERE semana >= ?", (semana_desde,))
+    for s in sesiones:
+        c.execute("""
+            INSERT INTO cronograma (semana, mes, mes_nombre, bloque, documento_id,
+            codigo_doc, nombre_actividad, horas, roles_aplicables, modalidad, prioridad)
+            VALUES (?,?,?,?,?,?,?,?,?,?,?)
+        """, (s["semana"], s["mes"], s["mes_nombre"], s["bloque"], s["documento_id"],
+              s["codigo_doc"], s["nombre_actividad"], s["horas"], s["roles_aplicables"],
+              s["modalidad"], s["prioridad"]))
+        cronograma_id = c.lastrowid
+        c.executemany("INSERT INTO cronograma_participantes VALUES (?,?)",
+                      [(cronograma_id, p) for p in s["participantes"]])
+
+def replanificar_cronograma(reiniciar=False, area=None):
+    """Vuelve a planificar desde la semana en curso con el avance actual.
+    Las semanas ya pasadas se conservan como registro de lo programado, salvo
+    con `reiniciar` (p. ej. al cambiar el inicio del período).
+    Devuelve el número de pares persona/documento que no caben en el período."""
+    sin_programar, = esperar_escrituras(
+        [get_cola_escritura(db_path(area)).enviar(_replanificar, reiniciar)])
+    return sin_programar
+
+def _replanificar(c, reiniciar):
+    # Lectura, plan y escritura en la misma transacción del escritor: un plan
+    # nunca se calcula antes de un avance confirmado y se guarda después.
+    conn = c.connection
+    inicio = get_inicio_cronograma(conn=conn)
+    if get_parametro("inicio_cronograma", "", conn=conn) == "":
+        # Primer plan del área: se fija el inicio para que las semanas no se
+        # corran al cambiar de semana, y se descarta lo programado sin él.
+        c.execute("INSERT INTO configuracion (clave, valor) VALUES ('inicio_cronograma', ?)",
+                  (inicio.isoformat(),))
+        reiniciar = True
+    desde = semana_actual(inicio)
+    sesiones, sin_programar = planificar_cronograma(
+        get_necesidades_formacion(conn=conn),
+        get_parametro("capacidad_semanal", CAPACIDAD_SEMANAL_DEFECTO, conn=conn),
+        get_parametro("max_horas_persona", MAX_HORAS_PERSONA_DEFECTO, conn=conn),
+        semana_inicial=desde, inicio=inicio,
+    )
+    _escribir_cronograma(c, 1 if reiniciar else desde, sesiones)
+    return sin_programar
+
+def get_cronograma(persona_id=None, area=None):
+    filtro = "WHERE c.id IN (SELECT cronograma_id FROM cronograma_participantes " \
+             "WHERE persona_id = ?)" if persona_id is not None else ""
+    return _leer_sql(f"""
+        SELECT c.semana, c.mes, c.mes_nombre, c.bloque, c.codigo_doc,
+               c.nombre_actividad, c.horas, c.roles_aplicables, c.modalidad,
+               c.prioridad,
+               (SELECT COUNT(*) FROM cronograma_participantes cp
+                WHERE cp.cronograma_id = c.id) AS personas
+        FROM cronograma c
+        {filtro}
+        ORDER BY c.semana, c.prioridad DESC, c.codigo_doc
+    """, (int(persona_id),) if persona_id is not None else None, area)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# EXPORTACIÓN COLUMNAR PARA BI (PARQUET / ARROW)
+# ─────────────────────────────────────────────────────────────────────────────
+# Complementa a exportar_excel: conserva los tipos, se escribe por bloques sin
+# cargar todo en memoria y permite extraer solo los cambios desde una marca.
+CONSULTA_MODELO_BI = """
+    SELECT p.id AS persona_id, p.nombre AS persona, p.rol, p.fecha_ingreso,
+           p.estado AS estado_persona,
+           d.id AS documento_id, d.codigo, d.nombre AS documento, d.categoria,
+           d.horas, d.nivel, d.norma_cubierta, d.es_critico,
+           a.id AS avance_id, COALESCE(a.estado, 'Pendiente') AS estado_avance,
+           a.fecha_inicio, a.fecha_completitud, a.calificacion, a.observaciones,
+           a.registrado_por, a.timestamp_registro
+    FROM personal p
+    JOIN requisitos_rol rr ON rr.rol = p.rol
+    JOIN documentos d ON d.id = rr.documento_id
+    LEFT JOIN avances a ON a.persona_id = p.id AND a.documento_id = d.id
+    ORDER BY p.id, d.id
+"""
+
+CONSULTA_CAMBIOS_BI = """
+    SELECT p.id AS persona_id, p.nombre AS persona, p.rol, p.fecha_ingreso,
+           p.estado AS estado_persona,
+           d.id AS documento_id, d.codigo, d.nombre AS documento, d.categoria,
+           d.horas, d.nivel, d.norma_cubierta, d.es_critico,
+           a.id AS avance_id, a.estado AS estado_avance,
+           a.fecha_inicio, a.fecha_completitud, a.calificacion, a.observaciones,
+           a.registrado_por, a.timestamp_registro
+    FROM avances a
+    JOIN personal p ON p.id = a.persona_id
+    JOIN documentos d ON d.id = a.documento_id
+    WHERE a.timestamp_registro >= ?
+    ORDER BY a.timestamp_registro, a.id
+"""
+
+TAM_LOTE_BI = 50_000
+
+def normalizar_marca(valor):
+    """Devuelve la marca `desde` como 'AAAA-MM-DD HH:MM:SS', el formato de
+    timestamp_registro, para que la comparación de texto en SQL sea correcta.
+    Lanza ValueError si no es una fecha/hora ISO válida."""
+    try:
+        marca = datetime.fromisoformat(str(valor).strip())
+    except ValueError:
+        raise ValueError(f"Marca no válida: '{valor}' (use AAAA-MM-DD HH:MM:SS)") from None
+    if marca.tzinfo is not None:
+        raise ValueError(f"Marca no válida: '{valor}' (sin zona horaria, en hora local)")
+    return marca.strftime("%Y-%m-%d %H:%M:%S")
+
+def _esquema_bi():
+    import pyarrow as pa
+    return pa.schema([
+        ("persona_id", pa.int32()), ("persona", pa.string()), ("rol", pa.string()),
+        ("fecha_ingreso", pa.date32()), ("estado_persona", pa.string()),
+        ("documento_id", pa.int32()), ("codigo", pa.string()),
+        ("documento", pa.string()), ("categoria", pa.string()),
+        ("horas", pa.float64()), ("nivel", pa.string()),
+        ("norma_cubierta", pa.string()), ("es_critico", pa.bool_()),
+        ("avance_id", pa.int32()), ("estado_avance", pa.string()),
+        ("fecha_inicio", pa.date32()), ("fecha_completitud", pa.date32()),
+        ("calificacion", pa.float64()), ("observaciones", pa.string()),
+        ("registrado_por", pa.string()), ("timestamp_registro", pa.timestamp("s")),
+    ])
+
+def _a_columna_arrow(valores, tipo):
+    import pyarrow as pa
+    if pa.types.is_date32(tipo):
+        valores = [date.fromisoformat(v) if v else None for v in valores]
+    elif pa.types.is_timestamp(tipo):
+        valores = [datetime.fromisoformat(v) if v else None for v in valores]
+    elif pa.types.is_boolean(tipo):
+        valores = [None if v is None else bool(v) for v in valores]
+    return pa.array(valores, type=tipo)
+
+def exportar_columnar(destino, formato="parquet", desde=None, tam_lote=TAM_LOTE_BI,
+                      area=None):
+    """Escribe el modelo unido personal/documentos/requisitos_rol/avances en
+    Parquet o Arrow IPC, por bloques de `tam_lote` filas. `destino` puede ser
+    una ruta o un objeto tipo archivo.
+
+    Con `desde` ('AAAA-MM-DD HH:MM:SS') solo se exportan los avances
+    registrados a partir de esa marca. La comparación es inclusiva (la marca
+    tiene resolución de segundos), así que los consumidores deben hacer upsert
+    por `avance_id`.
+
+    Devuelve (filas_escritas, marca_maxima) para pedir el siguiente delta."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if desde is not None:
+        desde = normalizar_marca(desde)
+    esquema = _esquema_bi()
+    if formato == "parquet":
+        escritor = pq.ParquetWriter(destino, esquema, compression="zstd")
+    elif formato == "arrow":
+        escritor = pa.ipc.new_file(destino, esquema)
+    else:
+        raise ValueError(f"Formato no soportado: {formato} (use 'parquet' o 'arrow')")
+
+    conn = get_conn(area)
+    filas_escritas, marca_maxima = 0, desde
+    try:
+        if desde is None:
+            cur = conn.execute(CONSULTA_MODELO_BI)
+        else:
+            cur = conn.execute(CONSULTA_CAMBIOS_BI, (desde,))
+        while True:
+            filas = cur.fetchmany(tam_lote)
+            if not filas:
+                break
+            columnas = list(zip(*filas))
+            escritor.write_batch(pa.record_batch(
+                [_a_columna_arrow(col, campo.type) for col, campo in zip(columnas, esquema)],
+                schema=esquema
+            ))
+            filas_escritas += len(filas)
+            marcas = [m for m in columnas[esquema.get_field_index("timestamp_registro")] if m]
+            if marcas:
+                marca_maxima = max([marca_maxima or ""] + marcas)
+    finally:
+        conn.close()
+        escritor.close()
+    return filas_escritas, marca_maxima
+
+
+def servir_bi(host="127.0.0.1", puerto=8765):
+    """Servidor HTTP local de solo lectura para los procesos de BI:
+        GET /modelo?formato=parquet|arrow&area=IIAD
+        GET /cambios?desde=AAAA-MM-DD HH:MM:SS&formato=parquet|arrow&area=IIAD
+    La cabecera X-Marca-Maxima trae la marca a usar como siguiente `desde`."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlparse, parse_qs
+
+    tipos = {"parquet": "application/vnd.apache.parquet",
+             "arrow": "application/vnd.apache.arrow.file"}
+
+    class ManejadorBI(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            args = {k: v[0] for k, v in parse_qs(url.query).items()}
+            formato = args.get("formato", "parquet")
+            if url.path not in ("/modelo", "/cambios") or formato not in tipos:
+                self.send_error(404, "Use /modelo o /cambios?desde=... con formato=parquet|arrow")
+                return
+            if url.path == "/cambios" and "desde" not in args:
+                self.send_error(400, "Falta el parámetro 'desde'")
+                return
+            area = args.get("area", AREA_DEFECTO)
+            if area not in AREAS:
+                self.send_error(400, f"Área desconocida: {area}")
+                return
+            desde = args.get("desde")
+            if desde is not None:
+                try:
+                    desde = normalizar_marca(desde)
+                except ValueError as e:
+                    self.send_error(400, str(e))
+                    return
+            buffer = BytesIO()
+            try:
+                filas, marca = exportar_columnar(buffer, formato, desde, area=area)
+            except (sqlite3.Error, ValueError) as e:
+                self.send_error(500, str(e))
+                return
+            cuerpo = buffer.getvalue()
+            self.send_response(200)
+            self.send_header("Content-Type", tipos[formato])
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.send_header("X-Filas", str(filas))
+            if marca:
+                self.send_header("X-Marca-Maxima", marca)
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+    servidor = ThreadingHTTPServer((host, puerto), ManejadorBI)
+    print(f"Exportación BI en http://{host}:{puerto}/modelo y /cambios?desde=...")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # ESTILOS CSS PERSONALIZADOS
 # ─────────────────────────────────────────────────────────────────────────────
@@ -370,21 +1225,24 @@ def inject_css():
 # PÁGINA 1: DASHBOARD PRINCIPAL
 # ─────────────────────────────────────────────────────────────────────────────
 def pagina_dashboard():
-    st.title("🏠 Dashboard — Sistema de Formación IIAD")
-    st.caption(f"📅 Actualizado: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
+    import pandas as pd
+    import plotly.graph_objects as go
+    st.title(f"🏠 Dashboard — Sistema de Formación {area_actual()}")
+
+    # Calcular estadísticas globales sobre una misma instantánea de la base
+    with lectura_consistente() as (conn, marca):
+        personal = get_personal(conn=conn)
+        all_stats = []
+        for _, p in personal.iterrows():
+            s = calcular_estadisticas_persona(p["id"], p["rol"], conn=conn)
+            s["nombre"] = p["nombre"]
+            s["rol"] = p["rol"]
+            all_stats.append(s)
+    st.caption(f"📅 Datos al: {_formato_marca(marca)}")
 
-    personal = get_personal()
     if personal.empty:
         st.warning("No hay personal registrado. Ve a ⚙️ Administración para agregar personas.")
         return
-
-    # Calcular estadísticas globales
-    all_stats = []
-    for _, p in personal.iterrows():
-        s = calcular_estadisticas_persona(p["id"], p["rol"])
-        s["nombre"] = p["nombre"]
-        s["rol"] = p["rol"]
-        all_stats.append(s)
     df_stats = pd.DataFrame(all_stats)
 
     avance_global = df_stats["pct_avance"].mean()
@@ -470,7 +1328,20 @@ def pagina_dashboard():
 # ─────────────────────────────────────────────────────────────────────────────
 # PÁGINA 2: REGISTRO DE AVANCES
 # ─────────────────────────────────────────────────────────────────────────────
+def _valor_o(fila, campo, defecto):
+    """Valor de la fila o `defecto` si falta; tras el merge los vacíos llegan como NaN."""
+    import pandas as pd
+    valor = fila.get(campo)
+    return defecto if valor is None or pd.isna(valor) or valor == "" else valor
+
+def _valores_avance(estado, fecha_inicio, fecha_fin, calificacion, observaciones):
+    """Valores del formulario en forma comparable (fechas ISO, vacíos como None/'')."""
+    return (estado, normalizar_fecha(fecha_inicio), normalizar_fecha(fecha_fin),
+            float(calificacion), str(observaciones or ""))
+
+
 def pagina_registro():
+    import numpy as np
     st.title("📝 Registro de Avances de Formación")
 
     personal = get_personal()
@@ -494,8 +1365,7 @@ def pagina_registro():
     # Cargar documentos y avances
     docs_rol = get_docs_por_rol(persona["rol"])
     avances = get_avance_persona(persona["id"])
-    merged = docs_rol.merge(avances, left_on="id", right_on="documento_id", how="left")
-    merged["estado"] = merged["estado"].fillna("Pendiente")
+    merged = _unir_avances(docs_rol, avances)
 
     st.divider()
 
@@ -510,19 +1380,22 @@ def pagina_registro():
     with col_f3:
         solo_criticos = st.checkbox("⚠️ Solo documentos críticos")
 
-    df_filtrado = merged.copy()
+    # Una sola máscara sobre códigos enteros y una sola selección final
+    mascara = np.ones(len(merged), dtype=bool)
     if filtro_estado != "Todos":
-        df_filtrado = df_filtrado[df_filtrado["estado"] == filtro_estado]
+        mascara &= merged["estado_cod"].to_numpy() == ESTADOS_AVANCE.index(filtro_estado)
     if filtro_cat != "Todas":
-        df_filtrado = df_filtrado[df_filtrado["categoria"] == filtro_cat]
+        categorias = merged["categoria"].cat
+        mascara &= categorias.codes.to_numpy() == categorias.categories.get_loc(filtro_cat)
     if solo_criticos:
-        df_filtrado = df_filtrado[df_filtrado["es_critico"] == 1]
+        mascara &= merged["es_critico"].to_numpy() == 1
+    df_filtrado = merged[mascara]
 
     st.subheader(f"📋 Documentos requeridos: {len(df_filtrado)} mostrados de {len(merged)} total")
 
     # Formulario de actualización masiva
     registrado_por = st.text_input("👤 Registrado por (nombre capacitador/responsable)",
-                                    value="Capacitador IIAD")
+                                    value=f"Capacitador {area_actual()}")
 
     cambios = {}
     for _, doc in df_filtrado.iterrows():
@@ -536,44 +1409,71 @@ def pagina_registro():
                     key=f"estado_{doc['id']}"
                 )
             with c2:
-                fecha_inicio_val = doc.get("fecha_inicio") or ""
+                fecha_inicio_val = _valor_o(doc, "fecha_inicio", "")
                 fecha_inicio = st.text_input("Fecha inicio (AAAA-MM-DD)",
                                              value=str(fecha_inicio_val) if fecha_inicio_val else "",
                                              key=f"fi_{doc['id']}")
-                fecha_fin_val = doc.get("fecha_completitud") or ""
+                fecha_fin_val = _valor_o(doc, "fecha_completitud", "")
                 fecha_fin = st.text_input("Fecha completitud (AAAA-MM-DD)",
                                           value=str(fecha_fin_val) if fecha_fin_val else "",
                                           key=f"ff_{doc['id']}")
             with c3:
-                cal_val = doc.get("calificacion") or 0.0
+                cal_val = _valor_o(doc, "calificacion", 0.0)
                 calificacion = st.number_input("Nota (0-100)",
                                                min_value=0.0, max_value=100.0,
                                                value=float(cal_val),
                                                key=f"cal_{doc['id']}")
             with c4:
-                obs_val = doc.get("observaciones") or ""
+                obs_val = _valor_o(doc, "observaciones", "")
                 observaciones = st.text_area("Observaciones",
                                               value=str(obs_val) if obs_val else "",
                                               key=f"obs_{doc['id']}", height=80)
                 st.caption(f"📌 Normas: {doc['norma_cubierta']}")
 
             cambios[doc["id"]] = {
-                "estado": nuevo_estado, "fecha_inicio": fecha_inicio,
+                "codigo": doc["codigo"], "estado": nuevo_estado, "fecha_inicio": fecha_inicio,
                 "fecha_fin": fecha_fin, "calificacion": calificacion,
-                "observaciones": observaciones
+                "observaciones": observaciones,
+                "antes": (doc["estado"], fecha_inicio_val, fecha_fin_val, cal_val, obs_val)
             }
 
     if st.button("💾 GUARDAR TODOS LOS CAMBIOS", type="primary", use_container_width=True):
-        for doc_id, data in cambios.items():
-            guardar_avance(
-                persona_id=persona["id"], documento_id=int(doc_id),
+        errores_fecha = []
+        for data in cambios.values():
+            for campo in ("fecha_inicio", "fecha_fin"):
+                try:
+                    normalizar_fecha(data[campo])
+                except ValueError as e:
+                    errores_fecha.append(f"{data['codigo']}: {e}")
+        if errores_fecha:
+            st.error("❌ Corrija las fechas antes de guardar:\n\n- " + "\n- ".join(errores_fecha))
+            return
+        # Solo se escriben los documentos editados: cada escritura mueve
+        # timestamp_registro y entra en el siguiente delta de BI.
+        cambios = {doc_id: data for doc_id, data in cambios.items()
+                   if _valores_avance(data["estado"], data["fecha_inicio"], data["fecha_fin"],
+                                      data["calificacion"], data["observaciones"])
+                   != _valores_avance(*data["antes"])}
+        if not cambios:
+            st.info("No hay cambios para guardar.")
+            return
+        try:
+            guardar_avances([dict(
+                persona_id=int(persona["id"]), documento_id=int(doc_id),
                 estado=data["estado"],
                 fecha_inicio=data["fecha_inicio"] or None,
                 fecha_completitud=data["fecha_fin"] or None,
                 calificacion=data["calificacion"],
                 observaciones=data["observaciones"],
                 registrado_por=registrado_por
-            )
+            ) for doc_id, data in cambios.items()])
+        except (sqlite3.Error, FuturesTimeoutError) as e:
+            st.error(f"❌ No se pudieron guardar los avances: {e}")
+            return
+        try:
+            replanificar_cronograma()
+        except (sqlite3.Error, FuturesTimeoutError) as e:
+            st.warning(f"⚠️ Avances guardados, pero no se pudo actualizar el cronograma: {e}")
         st.success(f"✅ Avances guardados para {nombre_sel}")
         st.rerun()
 
@@ -582,6 +1482,8 @@ def pagina_registro():
 # PÁGINA 3: ANÁLISIS POR ROL
 # ─────────────────────────────────────────────────────────────────────────────
 def pagina_analisis_rol():
+    import pandas as pd
+    import plotly.express as px
     st.title("📊 Análisis por Rol")
 
     personal = get_personal()
@@ -627,14 +1529,15 @@ def pagina_analisis_rol():
         docs_criticos = get_docs_por_rol(rol_sel)
         docs_criticos = docs_criticos[docs_criticos["es_critico"] == 1]
 
+        # Una consulta y un groupby en lugar de una consulta por persona y documento
+        avances = get_avances_estado()
+        completados = avances[(avances["estado_cod"] == COD_COMPLETADO) &
+                              avances["persona_id"].isin(personal_filtrado["id"])]
+        completaron_por_doc = completados.groupby("documento_id")["persona_id"].nunique()
+        total_aplica = len(personal_filtrado)
+
         for _, doc in docs_criticos.iterrows():
-            personas_completaron = 0
-            total_aplica = len(personal_filtrado)
-            for _, p in personal_filtrado.iterrows():
-                av = get_avance_persona(p["id"])
-                if not av.empty and ((av["documento_id"] == doc["id"]) &
-                                      (av["estado"] == "Completado")).any():
-                    personas_completaron += 1
+            personas_completaron = int(completaron_por_doc.get(doc["id"], 0))
             pct = personas_completaron / total_aplica * 100 if total_aplica > 0 else 0
             color = "🟢" if pct >= 80 else "🟡" if pct >= 40 else "🔴"
             st.write(f"{color} **{doc['codigo']}** — {doc['nombre']} — "
@@ -645,53 +1548,77 @@ def pagina_analisis_rol():
 # PÁGINA 4: CRONOGRAMA
 # ─────────────────────────────────────────────────────────────────────────────
 def pagina_cronograma():
+    import plotly.express as px
+    inicio = get_inicio_cronograma()
+    fin = inicio + timedelta(weeks=SEMANAS_CRONOGRAMA) - timedelta(days=1)
     st.title("📅 Cronograma de Entrenamiento — 6 Meses")
-    st.caption("Período: Marzo – Agosto 2026")
-
-    cronograma_data = [
-        (1, 1, "Mar", "Fundamentos SGC",      "GSA-SAD-MC-001",  "Manual SGC SAD",             1.5,  "TODOS",             "Presencial grupal",     "⚠️ CRÍTICA"),
-        (1, 1, "Mar", "Fundamentos SGC",      "GSA-SAD-MC-003",  "Manual Técnico AR",          4.0,  "TODOS",             "Presencial grupal",     "⚠️ CRÍTICA"),
-        (1, 1, "Mar", "Fundamentos SGC",      "GSA-SAD-P-009",   "Confidencialidad",           1.5,  "TODOS",             "Presencial grupal",     "⚠️ CRÍTICA"),
-        (2, 1, "Mar", "Fundamentos SGC",      "GSA-SAD-P-020",   "Manejo documentos SAD",      1.5,  "TODOS",             "Presencial grupal",     "ALTA"),
-        (2, 1, "Mar", "Fundamentos SGC",      "GSA-SAD-P-012",   "Gestión Personal",           3.0,  "Resp/Prof/Líderes", "Presencial grupal",     "ALTA"),
-        (3, 1, "Mar", "Normas ISO Núcleo",    "ISO 17034:2017",  "Requisitos PMR",             4.0,  "Resp/Prof/Líd.Prod","Taller externo INM",    "⚠️ CRÍTICA"),
-        (3, 1, "Mar", "Normas ISO Núcleo",    "ISO 17043:2023",  "Requisitos PEA",             4.0,  "Resp/Líd.Comp/PA",  "Taller externo INM",    "⚠️ CRÍTICA"),
-        (4, 1, "Mar", "Normas ISO Núcleo",    "ISO 17025:2017",  "Laboratorios",               3.0,  "TODOS",             "Autoestudio guiado",    "ALTA"),
-        (5, 2, "Abr", "Procesos Técnicos",    "GSA-SAD-P-024",   "Producción MR",              3.0,  "Resp/Prof/Líd.Prod","Taller técnico",        "⚠️ CRÍTICA"),
-        (5, 2, "Abr", "Procesos Técnicos",    "GSA-SAD-P-026",   "Homogeneidad y Estabilidad", 4.0,  "Resp/Líd.Prod/PA",  "Taller c/ejercicios",   "⚠️ CRÍTICA"),
-        (6, 2, "Abr", "Procesos Técnicos",    "GSA-SAD-P-031",   "Diseño EA/CI",               4.0,  "Líd.Comp/PA",       "Taller técnico",        "⚠️ CRÍTICA"),
-        (6, 2, "Abr", "Procesos Técnicos",    "GSA-SAD-P-033",   "Diseño estadístico PT",      4.0,  "Resp/Líd.Comp/PA",  "Taller c/software",     "⚠️ CRÍTICA"),
-        (7, 2, "Abr", "Estadística Crítica",  "ISO 13528:2022",  "Métodos Estadísticos PT",    8.0,  "Líd.Comp/PA/Resp",  "Curso externo CENAM",   "⚠️ MUY CRÍTICA"),
-        (8, 2, "Abr", "Estadística Crítica",  "GSA-SAD-P-027",   "Análisis datos PT",          4.0,  "Resp/Líd.Comp/PA",  "Taller casos prácticos","⚠️ CRÍTICA"),
-        (9, 3, "May", "Normas Técnicas",      "ISO 33405:2022",  "Homog. y Estab. (ex-G35)",   4.0,  "Todos técnicos",    "Taller externo",        "⚠️ CRÍTICA"),
-        (9, 3, "May", "Normas Técnicas",      "ISO 33403:2023",  "Caracterización MR",         4.0,  "Resp/Prof/Líd.Prod","Taller externo",        "⚠️ CRÍTICA"),
-        (10,3, "May", "Normas Técnicas",      "GSA-SAD-P-003",   "Incertidumbre",              4.0,  "TODOS",             "Taller c/ejercicios",   "ALTA"),
-        (10,3, "May", "Normas Técnicas",      "GSA-SAD-P-002",   "Validación métodos",         4.0,  "Resp/Prof/Líderes", "Taller técnico",        "ALTA"),
-        (11,3, "May", "Normas Técnicas",      "ISO 33402:2022",  "Certificados MRC",           3.0,  "Líd.Prod/Prof",     "Autoestudio+ejercicio", "ALTA"),
-        (13,4, "Jun", "SGC Operativo",        "GSA-SAD-P-001",   "Gestión equipos",            3.0,  "Resp/Líderes",      "Taller práctico",       "ALTA"),
-        (13,4, "Jun", "SGC Operativo",        "GSA-SAD-P-004",   "Trabajo no conforme",        3.0,  "Resp/Prof/Líderes", "Taller c/casos",        "ALTA"),
-        (15,4, "Jun", "SGC Operativo",        "GSA-I-SAD-006",   "Auditorías internas",        1.5,  "TODOS",             "Taller simulacro",      "ALTA"),
-        (17,5, "Jul", "Calidad Avanzada",     "GSA-I-SAD-038",   "Riesgos y oportunidades",    3.0,  "Resp/PA",           "Taller DOFA/AMFE",      "ALTA"),
-        (17,5, "Jul", "Calidad Avanzada",     "GSA-I-SAD-007",   "Acciones correctivas",       3.0,  "Resp/Líderes",      "Taller c/Form 3-604",   "ALTA"),
-        (22,6, "Ago", "Integración Final",    "SIMULACRO-AUDIT", "Simulacro auditoría",        4.0,  "TODOS",             "Auditoría simulada",    "⚠️ CRÍTICA"),
-        (24,6, "Ago", "Certificación",        "EVAL-FINAL",      "Evaluación Final Integral",  4.0,  "TODOS",             "Examen + entrevista",   "⚠️ CRÍTICA"),
-    ]
-    df_cron = pd.DataFrame(cronograma_data,
-        columns=["Semana","Mes","Mes_Nom","Bloque","Código","Actividad","Horas",
-                 "Roles","Modalidad","Prioridad"])
+    st.caption(f"Período: {inicio.strftime('%d/%m/%Y')} – {fin.strftime('%d/%m/%Y')} "
+               f"| Semana en curso: {semana_actual(inicio)}")
+    if date.today() > fin:
+        st.info("ℹ️ El período del cronograma ya terminó. Ajuste la fecha de inicio "
+                "en los parámetros del planificador para programar uno nuevo.")
+
+    with st.expander("⚙️ Parámetros del planificador"):
+        with st.form("form_planificador"):
+            col_p0, col_p1, col_p2 = st.columns(3)
+            with col_p0:
+                nuevo_inicio = st.date_input("Inicio del período", value=inicio)
+            with col_p1:
+                capacidad = st.number_input(
+                    "Capacidad semanal de capacitación (h)", min_value=1.0, step=0.5,
+                    value=get_parametro("capacidad_semanal", CAPACIDAD_SEMANAL_DEFECTO))
+            with col_p2:
+                max_horas = st.number_input(
+                    "Máximo de horas por persona y semana", min_value=0.5, step=0.5,
+                    value=get_parametro("max_horas_persona", MAX_HORAS_PERSONA_DEFECTO))
+            regenerar = st.form_submit_button("🔄 Regenerar cronograma")
+        st.caption("Se replanifica desde la semana en curso: críticos primero, "
+                   "agrupando a quienes comparten un requisito. También se "
+                   "replanifica automáticamente al guardar avances.")
+
+    df_cron = get_cronograma()
+    if regenerar or (df_cron.empty and date.today() <= fin):
+        try:
+            if regenerar:
+                guardar_parametros(capacidad_semanal=capacidad, max_horas_persona=max_horas,
+                                   inicio_cronograma=nuevo_inicio.isoformat())
+            st.session_state["cron_sin_programar"] = replanificar_cronograma(
+                reiniciar=regenerar and nuevo_inicio != inicio)
+        except (sqlite3.Error, FuturesTimeoutError) as e:
+            st.error(f"❌ No se pudo generar el cronograma: {e}")
+            return
+        st.rerun()
+    sin_programar = st.session_state.pop("cron_sin_programar", 0)
+    if sin_programar:
+        st.warning(f"⚠️ {sin_programar} asignaciones persona/documento no caben en el "
+                   f"período con estos parámetros.")
 
-    mes_sel = st.selectbox("Filtrar por mes",
-                           ["Todos"] + [f"Mes {i}" for i in range(1, 7)])
+    col_f1, col_f2 = st.columns(2)
+    with col_f1:
+        mes_sel = st.selectbox("Filtrar por mes",
+                               ["Todos"] + [f"Mes {i}" for i in sorted(df_cron["mes"].unique())])
+    with col_f2:
+        personal = get_personal()
+        persona_sel = st.selectbox("Filtrar por persona",
+                                   ["Todas"] + personal["nombre"].tolist())
+    if persona_sel != "Todas":
+        df_cron = get_cronograma(personal.loc[personal["nombre"] == persona_sel, "id"].iloc[0])
     if mes_sel != "Todos":
         mes_num = int(mes_sel.split()[-1])
-        df_cron = df_cron[df_cron["Mes"] == mes_num]
+        df_cron = df_cron[df_cron["mes"] == mes_num]
 
+    df_cron = df_cron.rename(columns={
+        "semana": "Semana", "mes": "Mes", "mes_nombre": "Mes_Nom", "bloque": "Bloque",
+        "codigo_doc": "Código", "nombre_actividad": "Actividad", "horas": "Horas",
+        "roles_aplicables": "Roles", "modalidad": "Modalidad", "prioridad": "Prioridad",
+        "personas": "Personas"})
     st.dataframe(df_cron[["Semana","Mes_Nom","Bloque","Código","Actividad",
-                           "Horas","Roles","Modalidad","Prioridad"]],
+                           "Horas","Personas","Roles","Modalidad","Prioridad"]],
                  use_container_width=True, hide_index=True)
 
     # Gráfico Gantt simplificado
-    meses_horas = df_cron.groupby("Mes_Nom")["Horas"].sum().reset_index()
+    meses_horas = (df_cron.groupby(["Mes", "Mes_Nom"])["Horas"].sum()
+                   .reset_index().sort_values("Mes"))
     fig = px.bar(meses_horas, x="Mes_Nom", y="Horas",
                  title="Distribución de Horas por Mes",
                  color="Horas", color_continuous_scale="Blues",
@@ -706,6 +1633,9 @@ def pagina_cronograma():
 def pagina_reportes():
     st.title("📋 Generación de Reportes")
     personal = get_personal()
+    if personal.empty:
+        st.warning("No hay personal registrado en esta área.")
+        return
 
     col1, col2 = st.columns(2)
     with col1:
@@ -714,11 +1644,12 @@ def pagina_reportes():
                                   key="rep_ind")
         persona = personal[personal["nombre"] == nombre_sel].iloc[0]
         if st.button("Generar Vista Previa"):
-            stats = calcular_estadisticas_persona(persona["id"], persona["rol"])
-            docs_rol = get_docs_por_rol(persona["rol"])
-            avances = get_avance_persona(persona["id"])
-            merged = docs_rol.merge(avances, left_on="id", right_on="documento_id", how="left")
-            merged["estado"] = merged["estado"].fillna("Pendiente")
+            with lectura_consistente() as (conn, marca):
+                stats = calcular_estadisticas_persona(persona["id"], persona["rol"], conn=conn)
+                docs_rol = get_docs_por_rol(persona["rol"], conn=conn)
+                avances = get_avance_persona(persona["id"], conn=conn)
+            merged = _unir_avances(docs_rol, avances)
+            st.caption(f"📅 Datos al: {_formato_marca(marca)}")
 
             st.info(f"""
             **{persona['nombre']}** | Rol: {persona['rol']}
@@ -733,21 +1664,48 @@ def pagina_reportes():
     with col2:
         st.subheader("📊 Reporte Ejecutivo (Excel)")
         st.write("Genera un resumen completo de todos los avances para exportar.")
-        excel_data = exportar_excel()
-        st.download_button(
-            label="⬇️ Descargar Reporte Excel",
-            data=excel_data,
-            file_name=f"Reporte_Formacion_IIAD_{date.today()}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            type="primary"
-        )
-        st.caption("Incluye: Maestro de personal + Resumen de avances por persona")
+        # El Excel (y openpyxl) solo se generan a pedido, no en cada visita a la página
+        clave_excel = f"reporte_excel_{area_actual()}"
+        if st.button("⚙️ Preparar Reporte Excel"):
+            st.session_state[clave_excel] = exportar_excel()
+        if clave_excel in st.session_state:
+            st.download_button(
+                label="⬇️ Descargar Reporte Excel",
+                data=st.session_state[clave_excel],
+                file_name=f"Reporte_Formacion_{area_actual()}_{date.today()}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                type="primary"
+            )
+        st.caption("Incluye: Maestro de personal + Resumen de avances por persona, "
+                   "leídos de una misma instantánea (fecha y hora en la hoja Información)")
+
+    st.divider()
+    st.subheader("📆 Completitudes por Período")
+    col_d1, col_d2 = st.columns(2)
+    with col_d1:
+        desde = st.date_input("Desde", value=date(date.today().year, 1, 1), key="rep_desde")
+    with col_d2:
+        hasta = st.date_input("Hasta", value=date.today(), key="rep_hasta")
+    if desde > hasta:
+        st.warning("La fecha inicial debe ser anterior a la final.")
+        return
+    # Gráfico y detalle de la misma instantánea, para que siempre coincidan
+    with lectura_consistente() as (conn, marca):
+        por_mes = get_completados_por_mes(desde, hasta, conn=conn)
+        detalle = get_completados_rango(desde, hasta, conn=conn)
+    if por_mes.empty:
+        st.info("No hay formaciones completadas en el período seleccionado.")
+        return
+    st.caption(f"📅 Datos al: {_formato_marca(marca)}")
+    st.bar_chart(por_mes, x="mes", y="completados")
+    st.dataframe(detalle, use_container_width=True, hide_index=True)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # PÁGINA 6: ADMINISTRACIÓN
 # ─────────────────────────────────────────────────────────────────────────────
 def pagina_admin():
+    import pandas as pd
     st.title("⚙️ Administración del Sistema")
 
     tab1, tab2, tab3 = st.tabs(["👥 Personal", "📚 Documentos", "🗄️ Base de Datos"])
@@ -760,21 +1718,17 @@ def pagina_admin():
         st.subheader("➕ Agregar Nueva Persona")
         with st.form("form_persona"):
             nombre = st.text_input("Nombre Completo")
-            rol = st.selectbox("Rol", [
-                "Responsable área IIAD", "Profesional área IIAD",
-                "Líder de producción", "Líder de comparación",
-                "Profesional análisis datos"
-            ])
+            rol = st.selectbox("Rol", get_roles())
             fecha_ingreso = st.date_input("Fecha de ingreso")
             submitted = st.form_submit_button("Guardar")
             if submitted and nombre:
-                conn = get_conn()
-                conn.execute("INSERT INTO personal (nombre, rol, fecha_ingreso) VALUES (?,?,?)",
-                             (nombre, rol, str(fecha_ingreso)))
-                conn.commit()
-                conn.close()
-                st.success(f"✅ {nombre} agregado correctamente")
-                st.rerun()
+                try:
+                    agregar_persona(nombre, rol, str(fecha_ingreso))
+                except (sqlite3.Error, FuturesTimeoutError) as e:
+                    st.error(f"❌ No se pudo agregar a {nombre}: {e}")
+                else:
+                    st.success(f"✅ {nombre} agregado correctamente")
+                    st.rerun()
 
     with tab2:
         st.subheader("Catálogo de Documentos")
@@ -791,39 +1745,91 @@ def pagina_admin():
         st.metric("Personal registrado", n_personal)
         st.metric("Documentos en catálogo", n_docs)
         st.metric("Registros de avance", n_avances)
-        st.info(f"Base de datos: `{os.path.abspath(DB_PATH)}`")
+        st.info(f"Base de datos ({area_actual()}): `{os.path.abspath(db_path())}`")
 
         if st.button("🗑️ REINICIAR BASE DE DATOS (¡Irreversible!)",
                      type="secondary"):
-            if os.path.exists(DB_PATH):
-                os.remove(DB_PATH)
+            if os.path.exists(db_path()):
+                # En modo WAL también hay que borrar los archivos -wal y -shm
+                for sufijo in ("", "-wal", "-shm"):
+                    if os.path.exists(db_path() + sufijo):
+                        os.remove(db_path() + sufijo)
+                _init_db_una_vez.clear()
                 st.warning("Base de datos eliminada. Recarga la página.")
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# PÁGINA 7: VISTA EJECUTIVA MULTIÁREA
+# ─────────────────────────────────────────────────────────────────────────────
+def pagina_ejecutiva():
+    st.title("🌐 Vista Ejecutiva — Todas las Áreas")
+    resumen = resumen_ejecutivo_areas()
+    if resumen.empty:
+        st.warning("Ninguna área tiene base de datos todavía.")
+        return
+    sin_datos = [a for a in AREAS if a not in set(resumen["area"])]
+    if sin_datos:
+        st.caption(f"Sin base de datos aún: {', '.join(sin_datos)}")
+
+    total = resumen[resumen["area"] == "TOTAL"].iloc[0]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("📊 Avance Promedio", f"{total['avance_promedio']:.1f}%")
+    col2.metric("✅ Personas Certificadas",
+                f"{int(total['personas_completas'])}/{int(total['personas'])}")
+    col3.metric("⚠️ Personas en Alerta", str(int(total["personas_alerta"])))
+    col4.metric("⏱️ Horas Completadas", f"{total['horas_completadas']:.0f}h")
+
+    st.dataframe(resumen.rename(columns={
+        "area": "Área", "nombre": "Nombre", "personas": "Personas",
+        "requisitos": "Requisitos", "completados": "Completados", "en_curso": "En curso",
+        "horas_totales": "Horas Totales", "horas_completadas": "Horas Completadas",
+        "personas_completas": "Certificadas", "personas_alerta": "En Alerta",
+        "avance_promedio": "% Avance Promedio"}),
+        use_container_width=True, hide_index=True)
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # NAVEGACIÓN PRINCIPAL
 # ─────────────────────────────────────────────────────────────────────────────
+@st.cache_resource
+def _init_db_una_vez(area):
+    """Crea/migra la base de cada área una sola vez por proceso y no en cada rerun."""
+    init_db(area)
+
+
 def main():
-    init_db()
+    st.set_page_config(
+        page_title="Sistema Formación ICA",
+        page_icon="🧪",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
     inject_css()
 
     with st.sidebar:
         st.image("https://upload.wikimedia.org/wikipedia/commons/thumb/4/49/Instituto_Colombiano_Agropecuario.svg/320px-Instituto_Colombiano_Agropecuario.svg.png",
                  width=120)
-        st.title("Sistema Formación\nÁrea IIAD")
+        if len(AREAS) > 1:
+            st.selectbox("Área", list(AREAS), key="area",
+                         format_func=lambda a: AREAS[a]["nombre"])
+        st.title(f"Sistema Formación\n{AREAS[area_actual()]['nombre']}")
         st.caption("ISO 17034 | ISO 17043 | ICA")
         st.divider()
-        pagina = st.radio("Navegación", [
+        paginas = [
             "🏠 Dashboard",
             "📝 Registro de Avances",
             "📊 Análisis por Rol",
             "📅 Cronograma",
             "📋 Reportes",
             "⚙️ Administración"
-        ])
+        ]
+        if len(AREAS) > 1:
+            paginas.append("🌐 Vista Ejecutiva")
+        pagina = st.radio("Navegación", paginas)
         st.divider()
         st.caption("v1.0 — Feb 2026")
 
+    _init_db_una_vez(area_actual())
     if pagina == "🏠 Dashboard":
         pagina_dashboard()
     elif pagina == "📝 Registro de Avances":
@@ -836,7 +1842,59 @@ def main():
         pagina_reportes()
     elif pagina == "⚙️ Administración":
         pagina_admin()
+    elif pagina == "🌐 Vista Ejecutiva":
+        pagina_ejecutiva()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# LÍNEA DE COMANDOS (fuera de Streamlit)
+# ─────────────────────────────────────────────────────────────────────────────
+def _marca_cli(valor):
+    try:
+        return normalizar_marca(valor)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python app_iiad.py",
+        description="Utilidades de exportación del Sistema de Formación ICA. "
+                    "La interfaz web se inicia con: streamlit run app_iiad.py")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_modelo = sub.add_parser("exportar-bi", help="Modelo completo en Parquet/Arrow")
+    p_cambios = sub.add_parser("cambios", help="Avances registrados desde una marca")
+    p_cambios.add_argument("--desde", required=True, type=_marca_cli,
+                           help="Marca 'AAAA-MM-DD HH:MM:SS' (inclusiva)")
+    for p in (p_modelo, p_cambios):
+        p.add_argument("--area", choices=list(AREAS), default=AREA_DEFECTO)
+        p.add_argument("--salida", required=True, help="Archivo de destino")
+        p.add_argument("--formato", choices=["parquet", "arrow"], default="parquet")
+        p.add_argument("--lote", type=int, default=TAM_LOTE_BI, help="Filas por bloque")
+
+    p_servir = sub.add_parser("servir-bi", help="Endpoint HTTP local de exportación")
+    p_servir.add_argument("--host", default="127.0.0.1")
+    p_servir.add_argument("--puerto", type=int, default=8765)
+
+    args = parser.parse_args(argv)
+    if args.comando == "servir-bi":
+        for area in AREAS:
+            init_db(area)
+        servir_bi(args.host, args.puerto)
+        return 0
+    init_db(args.area)
+    filas, marca = exportar_columnar(args.salida, args.formato,
+                                     getattr(args, "desde", None), args.lote, args.area)
+    print(f"{filas} filas escritas en {args.salida}")
+    if marca:
+        print(f"Marca máxima (usar como siguiente --desde): {marca}")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    from streamlit import runtime
+    if runtime.exists():
+        main()
+    else:
+        sys.exit(cli())
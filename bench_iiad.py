@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# =============================================================================
+# BENCHMARK DE ARRANQUE Y PLANIFICADOR - SISTEMA DE FORMACIÓN IIAD
+# =============================================================================
+# Mide, en procesos nuevos (como tras un reinicio en Streamlit Cloud):
+#   1. El tiempo de importación de app_iiad con `python -X importtime`,
+#      descontando el de streamlit, y lo compara con un presupuesto.
+#   2. Que los módulos pesados (pandas, plotly.express, openpyxl,
+#      pyarrow) no se carguen al importar la app.
+#   3. El tiempo hasta renderizar la primera página (Dashboard) con AppTest.
+#   4. El tiempo del planificador del cronograma con datos sintéticos
+#      (cientos de personas y documentos) frente a su presupuesto.
+# EJECUCIÓN:
+#   python bench_iiad.py        (sale con código 1 si se excede el presupuesto)
+# =============================================================================
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = os.path.join(APP_DIR, "app_iiad.py")
+
+PRESUPUESTO_IMPORT_MS = 150     # importación propia de la app (sin streamlit)
+PRESUPUESTO_PLANIFICADOR_MS = 1000
+PERSONAS_SINTETICAS, DOCUMENTOS_SINTETICOS, ROLES_SINTETICOS = 500, 300, 8
+# streamlit ya importa `plotly` y `plotly.graph_objects`, que cargan sus clases
+# de forma diferida (~3 ms); lo pesado es plotly.express.
+MODULOS_DIFERIDOS = ["pandas", "plotly.express", "openpyxl", "pyarrow"]
+
+
+def _importtime(codigo, cwd):
+    """Ejecuta `codigo` con -X importtime y devuelve {modulo: acumulado_us}."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo],
+                          cwd=cwd, capture_output=True, text=True, check=True)
+    tiempos = {}
+    for linea in proc.stderr.splitlines():
+        if not linea.startswith("import time:") or "|" not in linea:
+            continue
+        partes = [p.strip() for p in linea[len("import time:"):].split("|")]
+        if not partes[1].isdigit():
+            continue  # encabezado
+        modulo = partes[2].strip()
+        tiempos[modulo] = int(partes[1])
+    return tiempos, proc.stdout
+
+
+def medir_importacion(cwd):
+    codigo = (f"import sys; sys.path.insert(0, {APP_DIR!r}); import app_iiad; "
+              f"print(','.join(m for m in {MODULOS_DIFERIDOS!r} if m in sys.modules))")
+    tiempos, salida = _importtime(codigo, cwd)
+    total_ms = tiempos["app_iiad"] / 1000
+    streamlit_ms = tiempos.get("streamlit", 0) / 1000
+    cargados = [m for m in salida.strip().split(",") if m]
+    return total_ms, streamlit_ms, cargados
+
+
+def medir_primera_pagina(cwd):
+    codigo = (
+        "import time; t0 = time.perf_counter();"
+        "from streamlit.testing.v1 import AppTest;"
+        f"at = AppTest.from_file({APP_FILE!r}, default_timeout=60).run();"
+        "assert not at.exception, at.exception;"
+        "print(f'{(time.perf_counter() - t0) * 1000:.0f}')"
+    )
+    proc = subprocess.run([sys.executable, "-c", codigo], cwd=cwd,
+                          capture_output=True, text=True, check=True)
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+def medir_planificador():
+    """Planifica 26 semanas para datos sintéticos; devuelve (ms, necesidades, sesiones)."""
+    sys.path.insert(0, APP_DIR)
+    import numpy as np
+    import pandas as pd
+    import app_iiad
+
+    rng = np.random.default_rng(0)
+    docs = pd.DataFrame({
+        "documento_id": np.arange(1, DOCUMENTOS_SINTETICOS + 1),
+        "codigo": [f"DOC-{i:03d}" for i in range(DOCUMENTOS_SINTETICOS)],
+        "nombre": "Documento sintético",
+        "categoria": rng.choice(["SGC Base", "Normas ISO", "Proceso Técnico"],
+                                DOCUMENTOS_SINTETICOS),
+        "horas": rng.choice([1.5, 3.0, 4.0, 8.0], DOCUMENTOS_SINTETICOS),
+        "es_critico": (rng.random(DOCUMENTOS_SINTETICOS) < 0.3).astype(int),
+    })
+    requisitos = {r: rng.choice(DOCUMENTOS_SINTETICOS, 60, replace=False) + 1
+                  for r in range(ROLES_SINTETICOS)}
+    filas = [(p, f"Rol {p % ROLES_SINTETICOS}", d)
+             for p in range(1, PERSONAS_SINTETICAS + 1)
+             for d in requisitos[p % ROLES_SINTETICOS] if rng.random() < 0.7]
+    necesidades = app_iiad._compactar(
+        pd.DataFrame(filas, columns=["persona_id", "rol", "documento_id"])
+        .merge(docs, on="documento_id"))
+
+    t0 = time.perf_counter()
+    sesiones, _ = app_iiad.planificar_cronograma(necesidades, 200.0, 6.0)
+    return (time.perf_counter() - t0) * 1000, len(necesidades), len(sesiones)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        total_ms, streamlit_ms, cargados = medir_importacion(tmp)
+        propio_ms = total_ms - streamlit_ms
+        primera_ms = medir_primera_pagina(tmp)
+    plan_ms, n_necesidades, n_sesiones = medir_planificador()
+
+    print("=== Benchmark de arranque (app_iiad) ===")
+    print(f"import app_iiad (total, -X importtime):   {total_ms:8.1f} ms")
+    print(f"  de ellos streamlit:                     {streamlit_ms:8.1f} ms")
+    print(f"  importación propia de la app:           {propio_ms:8.1f} ms "
+          f"(presupuesto {PRESUPUESTO_IMPORT_MS} ms)")
+    print(f"Módulos pesados cargados al importar:     {', '.join(cargados) or 'ninguno'}")
+    print(f"Primera página (Dashboard, proceso nuevo): {primera_ms:7.0f} ms")
+    print(f"Planificador ({PERSONAS_SINTETICAS} personas x {DOCUMENTOS_SINTETICOS} documentos, "
+          f"{n_necesidades} necesidades -> {n_sesiones} sesiones): {plan_ms:.1f} ms "
+          f"(presupuesto {PRESUPUESTO_PLANIFICADOR_MS} ms)")
+
+    ok = (propio_ms <= PRESUPUESTO_IMPORT_MS and not cargados
+          and plan_ms <= PRESUPUESTO_PLANIFICADOR_MS)
+    print("RESULTADO:", "OK" if ok else "PRESUPUESTO EXCEDIDO")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())